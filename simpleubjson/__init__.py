@@ -80,7 +80,7 @@ def encode(data, output=None, default=None, spec='draft-9'):
     """
     if spec.lower() in ['draft8', 'draft-8']:
         warnings.warn(_DRAFT8_DEPRECATED, DeprecationWarning)
-        res = _draft8_encoder(default).encode_next(data)
+        return _draft8_encoder(default).encode_next(data, output)
     elif spec.lower() in ['draft9', 'draft-9']:
         res = _draft9_encoder(default).encode_next(data)
     else:
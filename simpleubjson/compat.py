@@ -10,6 +10,7 @@
 import sys
 
 version = '.'.join(map(str, sys.version_info[:2]))
+PY3 = version >= '3.0'
 
 if version >= '3.0':
     from io import BytesIO
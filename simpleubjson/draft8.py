@@ -7,11 +7,13 @@
 # you should have received as part of this distribution.
 #
 
+import sys
+from array import array
 from decimal import Decimal
-from struct import pack, unpack
+from struct import Struct, error as StructError
 from . import NOOP as NOOP_SENTINEL
 from .compat import (
-    BytesIO, b, bytes, unicode, basestring, long, xrange,
+    PY3, BytesIO, b, bytes, unicode, basestring, long, xrange,
     dict_itemsiterator, dict_keysiterator, dict_valuesiterator,
     isinf, isnan
 )
@@ -20,41 +22,229 @@ from .exceptions import (
 )
 
 
-NOOP = b('N')
-EOS = b('E')
-NULL = b('Z')
-FALSE = b('F')
-TRUE = b('T')
-INT8 = b('B')
-INT16 = b('i')
-INT32 = b('I')
-INT64 = b('L')
-FLOAT = b('d')
-DOUBLE = b('D')
-STRING_S = b('s')
-STRING_L = b('S')
-HIDEF_S = b('h')
-HIDEF_L = b('H')
-ARRAY_S = b('a')
-OBJECT_S = b('o')
-ARRAY_L = b('A')
-OBJECT_L = b('O')
-FF = b(chr(255))
+NOOP = ord('N')
+EOS = ord('E')
+NULL = ord('Z')
+FALSE = ord('F')
+TRUE = ord('T')
+INT8 = ord('B')
+INT16 = ord('i')
+INT32 = ord('I')
+INT64 = ord('L')
+FLOAT = ord('d')
+DOUBLE = ord('D')
+STRING_S = ord('s')
+STRING_L = ord('S')
+HIDEF_S = ord('h')
+HIDEF_L = ord('H')
+ARRAY_S = ord('a')
+OBJECT_S = ord('o')
+ARRAY_L = ord('A')
+OBJECT_L = ord('O')
+FF = 255
 
 BOS_A = object()
 BOS_O = object()
 
-CONSTANTS = set([NOOP, EOS, NULL, FALSE, TRUE])
-NUMBERS = set([INT8, INT16, INT32, INT64, FLOAT, DOUBLE])
-STRINGS = set([STRING_S, STRING_L, HIDEF_S, HIDEF_L])
-SHORT_OBJ = set([STRING_S, HIDEF_S, ARRAY_S, OBJECT_S])
-LARGE_OBJ = set([STRING_L, HIDEF_L, ARRAY_L, OBJECT_L])
-STREAMS = set([ARRAY_S, OBJECT_S])
-OBJECT_KEYS = set([STRING_S, STRING_L])
-FORBIDDEN = set([NOOP, EOS])
+CONSTANTS = frozenset([NOOP, EOS, NULL, FALSE, TRUE])
+NUMBERS = frozenset([INT8, INT16, INT32, INT64, FLOAT, DOUBLE])
+STRINGS = frozenset([STRING_S, STRING_L, HIDEF_S, HIDEF_L])
+SHORT_OBJ = frozenset([STRING_S, HIDEF_S, ARRAY_S, OBJECT_S])
+LARGE_OBJ = frozenset([STRING_L, HIDEF_L, ARRAY_L, OBJECT_L])
+STREAMS = frozenset([ARRAY_S, OBJECT_S])
+OBJECT_KEYS = frozenset([STRING_S, STRING_L])
+FORBIDDEN = frozenset([NOOP, EOS])
 
 CHARS = dict((i, b(chr(i))) for i in range(256))
 
+# Unsigned byte to int8 value mapping
+_SIGNED_BYTE = tuple((i - 256 if i > 127 else i) for i in range(256))
+
+# Values of markers which are decoded without dispatching
+SCALARS = {NULL: None, FALSE: False, TRUE: True}
+
+#: Min length of long strings which are decoded in place, without copying
+#: their data out of the source buffer first.
+STRING_VIEW_MIN_LENGTH = 16384
+
+#: Size of encoded data chunks written into output stream.
+BUFFER_SIZE = 65536
+
+#: Min length of sized array to try decode or encode it as homogeneous
+#: numbers array.
+BULK_MIN_LENGTH = 32
+
+
+def _find_typecode(size, typecodes):
+    for typecode in typecodes:
+        try:
+            if array(typecode).itemsize == size:
+                return typecode
+        except ValueError:
+            # typecode isn't supported, like 'q' on Python 2
+            continue
+
+
+# Number marker to (value size, array typecode) mapping for bulk decoding
+BULK_NUMBERS = {}
+for _tag, _size, _typecodes in [(INT8, 1, 'b'), (INT16, 2, 'h'),
+                                (INT32, 4, 'il'), (INT64, 8, 'ql'),
+                                (FLOAT, 4, 'f'), (DOUBLE, 8, 'd')]:
+    _typecode = _find_typecode(_size, _typecodes)
+    if _typecode is not None:
+        BULK_NUMBERS[_tag] = (_size, _typecode)
+del _tag, _size, _typecodes, _typecode
+
+
+def _unpack_numbers(buf, pos, length):
+    # Draft-8 repeats the marker for every array item, so an array of
+    # numbers of the same type is a fixed stride sequence of
+    # `marker + big-endian value` records that could be unpacked at once
+    if pos >= len(buf):
+        return None
+    tag = buf[pos]
+    if tag not in BULK_NUMBERS:
+        return None
+    size, typecode = BULK_NUMBERS[tag]
+    step = size + 1
+    end = pos + length * step
+    if end > len(buf) or buf[pos:end:step] != CHARS[tag] * length:
+        return None
+    if size == 1:
+        data = buf[pos + 1:end:step]
+    else:
+        data = bytearray(length * size)
+        for i in range(size):
+            data[i::size] = buf[pos + 1 + i:end:step]
+        data = bytes(data)
+    values = array(typecode, data)
+    if size > 1 and sys.byteorder == 'little':
+        values.byteswap()
+    return values.tolist(), end
+
+
+_INT_TYPES = frozenset([int, long])
+_array_tobytes = getattr(array, 'tobytes', getattr(array, 'tostring', None))
+
+#: Max length of object keys that are cached by decoder.
+KEY_CACHE_MAX_LENGTH = 32
+#: Max number of cached object keys per decoder.
+KEY_CACHE_SIZE = 256
+
+_unpack_int16 = Struct('>h').unpack
+_unpack_int32 = Struct('>i').unpack
+_unpack_int64 = Struct('>q').unpack
+_unpack_float = Struct('>f').unpack
+_unpack_double = Struct('>d').unpack
+_unpack_uint32 = Struct('>I').unpack
+
+_unpack_int16_from = Struct('>h').unpack_from
+_unpack_int32_from = Struct('>i').unpack_from
+_unpack_int64_from = Struct('>q').unpack_from
+_unpack_float_from = Struct('>f').unpack_from
+_unpack_double_from = Struct('>d').unpack_from
+_unpack_uint32_from = Struct('>I').unpack_from
+
+# Packers of marker and value pairs
+_pack_int16 = Struct('>Bh').pack
+_pack_int32 = Struct('>Bi').pack
+_pack_int64 = Struct('>Bq').pack
+_pack_float = Struct('>Bf').pack
+_pack_double = Struct('>Bd').pack
+_pack_short_size = Struct('>BB').pack
+_pack_large_size = Struct('>BI').pack
+
+# Precomputed headers of short strings and containers
+_STRING_S_HEADERS = [_pack_short_size(STRING_S, i) for i in range(256)]
+_HIDEF_S_HEADERS = [_pack_short_size(HIDEF_S, i) for i in range(256)]
+_ARRAY_S_HEADERS = [_pack_short_size(ARRAY_S, i) for i in range(256)]
+_OBJECT_S_HEADERS = [_pack_short_size(OBJECT_S, i) for i in range(256)]
+
+_INT8_VALUES = dict((i, CHARS[INT8] + CHARS[i & 0xff])
+                    for i in range(-128, 128))
+
+# Bit length of integer magnitude to marker mapping
+_INT_MARKERS = [INT8] * 8 + [INT16] * 8 + [INT32] * 16 + [INT64] * 32
+
+# Bit length of integer magnitude to (marker, packer) mapping. Int8 values
+# are handled separately.
+_INT_PACKERS = ([None] * 8 +
+                [(INT16, _pack_int16)] * 8 +
+                [(INT32, _pack_int32)] * 16 +
+                [(INT64, _pack_int64)] * 32)
+
+
+def _read_marker(read):
+    return None, None
+
+
+def _read_int8(read):
+    return None, _SIGNED_BYTE[ord(read(1))]
+
+
+def _read_int16(read):
+    return None, _unpack_int16(read(2))[0]
+
+
+def _read_int32(read):
+    return None, _unpack_int32(read(4))[0]
+
+
+def _read_int64(read):
+    return None, _unpack_int64(read(8))[0]
+
+
+def _read_float(read):
+    return None, _unpack_float(read(4))[0]
+
+
+def _read_double(read):
+    return None, _unpack_double(read(8))[0]
+
+
+def _read_short_size(read):
+    return ord(read(1)), None
+
+
+def _read_large_size(read):
+    return _unpack_uint32(read(4))[0], None
+
+
+def _read_short_string(read):
+    length = ord(read(1))
+    if length == 255:
+        raise MarkerError('Short string objects should not have length 255')
+    return length, read(length)
+
+
+def _read_large_string(read):
+    length, = _unpack_uint32(read(4))
+    return length, read(length)
+
+
+# Tag to `(length, value)` reader mapping for stream sources
+_TLV_READERS = {
+    NOOP: _read_marker,
+    EOS: _read_marker,
+    NULL: _read_marker,
+    FALSE: _read_marker,
+    TRUE: _read_marker,
+    INT8: _read_int8,
+    INT16: _read_int16,
+    INT32: _read_int32,
+    INT64: _read_int64,
+    FLOAT: _read_float,
+    DOUBLE: _read_double,
+    STRING_S: _read_short_string,
+    HIDEF_S: _read_short_string,
+    ARRAY_S: _read_short_size,
+    OBJECT_S: _read_short_size,
+    STRING_L: _read_large_string,
+    HIDEF_L: _read_large_string,
+    ARRAY_L: _read_large_size,
+    OBJECT_L: _read_large_size,
+}
+
 __all__ = ['Draft8Decoder', 'Draft8Encoder']
 
 
@@ -125,62 +315,150 @@ class Draft8Decoder(object):
     def __init__(self, source, allow_noop=False):
         if isinstance(source, unicode):
             source = source.encode('utf-8')
-        if isinstance(source, bytes):
-            source = BytesIO(source)
-        self.read = source.read
+        if isinstance(source, bytes) and PY3:
+            # In-memory data is scanned in place with an integer cursor
+            # instead of going through file-like `.read()` calls.
+            self._buf = source
+            self._pos = 0
+            self._read = None
+        else:
+            if isinstance(source, bytes):
+                source = BytesIO(source)
+            self._buf = None
+            self._read = source.read
         self.allow_noop = allow_noop
         self.dispatch = self.dispatch.copy()
+        self._key_cache = {}
 
     def __iter__(self):
         return self
 
+    @classmethod
+    def compile_schema(cls, schema):
+        """Compiles decoder of data which follows known schema. Returned
+        function takes source string, decodes it with straight code generated
+        for the schema and falls back to regular decoding if data doesn't
+        match it.
+
+        Schema is described with Python types: :class:`bool`, :class:`int`,
+        :class:`float` and :class:`unicode` for scalar values, one item list
+        with item schema for sized arrays and dict of keys and value schemas
+        for sized objects with exactly the same keys in the same order::
+
+            decode = Draft8Decoder.compile_schema({'id': int,
+                                                   'tags': [unicode]})
+            data = decode(source)
+
+        :param schema: Data schema.
+
+        :return: Decoding function.
+        """
+        decode_schema = _SchemaCompiler().compile(schema)
+
+        def decode(data):
+            if isinstance(data, unicode):
+                data = data.encode('utf-8')
+            # generated code indexes source bytes as integers, so streams
+            # and Python 2 strings are left for regular decoder
+            if isinstance(data, bytes) and PY3:
+                try:
+                    return decode_schema(data, 0)[0]
+                except (_SchemaMismatch, IndexError, ValueError, StructError):
+                    pass
+            return cls(data).decode_next()
+        return decode
+
+    def read(self, size):
+        buf = self._buf
+        if buf is None:
+            return self._read(size)
+        pos = self._pos
+        self._pos = pos + size
+        return buf[pos:pos + size]
+
     def next_tlv(self):
-        tag = self.read(1)
-        while tag == NOOP and not self.allow_noop:
-            tag = self.read(1)
+        buf = self._buf
+        if buf is None:
+            read = self._read
+            while 1:
+                tag = read(1)
+                if not tag:
+                    raise EarlyEndOfStreamError('nothing to decode')
+                tag = ord(tag)
+                if tag != NOOP or self.allow_noop:
+                    break
+            handler = _TLV_READERS.get(tag)
+            if handler is None:
+                raise MarkerError('invalid marker 0x%02x (%r)'
+                                  % (tag, CHARS[tag]))
+            length, value = handler(read)
+            return tag, length, value
+        pos = self._pos
+        try:
+            tag = buf[pos]
+            while tag == NOOP and not self.allow_noop:
+                pos += 1
+                tag = buf[pos]
+        except IndexError:
+            raise EarlyEndOfStreamError('nothing to decode')
+        pos += 1
+        # buffer values are unpacked inline: a reader call per value costs
+        # more than walking these few branches
         if tag in NUMBERS:
             if tag == INT8:
-                # Trivial operations for trivial cases saves a lot of time
-                value = ord(self.read(1))
-                if value > 128:
-                    value -= 256
-                    #value, = unpack('>b', self.read(1))
+                value = _SIGNED_BYTE[buf[pos]]
+                pos += 1
             elif tag == INT16:
-                value, = unpack('>h', self.read(2))
+                value, = _unpack_int16_from(buf, pos)
+                pos += 2
             elif tag == INT32:
-                value, = unpack('>i', self.read(4))
+                value, = _unpack_int32_from(buf, pos)
+                pos += 4
             elif tag == INT64:
-                value, = unpack('>q', self.read(8))
+                value, = _unpack_int64_from(buf, pos)
+                pos += 8
             elif tag == FLOAT:
-                value, = unpack('>f', self.read(4))
-            elif tag == DOUBLE:
-                value, = unpack('>d', self.read(8))
+                value, = _unpack_float_from(buf, pos)
+                pos += 4
             else:
-                raise MarkerError('tag %r not in NUMBERS %r' % (tag, NUMBERS))
+                value, = _unpack_double_from(buf, pos)
+                pos += 8
+            self._pos = pos
             return tag, None, value
         elif tag in SHORT_OBJ:
-            length = ord(self.read(1))
+            length = buf[pos]
+            pos += 1
             if tag in STRINGS:
                 if length == 255:
                     raise MarkerError(
                         'Short string objects (%r) should not have length 255'
-                        % tag)
-                return tag, length, self.read(length)
+                        % CHARS[tag])
+                self._pos = pos + length
+                return tag, length, buf[pos:pos + length]
+            self._pos = pos
             return tag, length, None
         elif tag in LARGE_OBJ:
-            length, = unpack('>I', self.read(4))
+            length, = _unpack_uint32_from(buf, pos)
+            pos += 4
             if tag in STRINGS:
-                return tag, length, self.read(length)
+                self._pos = pos + length
+                if length >= STRING_VIEW_MIN_LENGTH:
+                    return tag, length, memoryview(buf)[pos:pos + length]
+                return tag, length, buf[pos:pos + length]
+            self._pos = pos
             return tag, length, None
         elif tag in CONSTANTS:
+            self._pos = pos
             return tag, None, None
-        elif not tag:
-            raise EarlyEndOfStreamError('nothing to decode')
-        else:
-            raise MarkerError('invalid marker 0x%02x (%r)' % (ord(tag), tag))
+        raise MarkerError('invalid marker 0x%02x (%r)' % (tag, CHARS[tag]))
 
     def decode_next(self):
         tag, length, value = self.next_tlv()
+        # numbers and constants are already final values, no need to dispatch
+        if tag in NUMBERS:
+            return value
+        elif tag in SCALARS:
+            return SCALARS[tag]
         return self.dispatch[tag](self, tag, length, value)
 
     __next__ = next = decode_next
@@ -214,11 +492,16 @@ class Draft8Decoder(object):
     dispatch[DOUBLE] = decode_float
 
     def decode_string(self, tag, length, value):
+        if length >= STRING_VIEW_MIN_LENGTH:
+            # value may be a memoryview, which has no .decode()
+            return unicode(value, 'utf-8')
         return value.decode('utf-8')
     dispatch[STRING_S] = decode_string
     dispatch[STRING_L] = decode_string
 
     def decode_hidef(self, tag, length, value):
+        if length >= STRING_VIEW_MIN_LENGTH:
+            return Decimal(unicode(value, 'utf-8'))
         return Decimal(value.decode('utf-8'))
     dispatch[HIDEF_S] = decode_hidef
     dispatch[HIDEF_L] = decode_hidef
@@ -226,19 +509,31 @@ class Draft8Decoder(object):
     def decode_array(self, tag, length, value):
         if tag == ARRAY_S and length == 255:
             return self.decode_array_stream(tag, length, value)
+        if length >= BULK_MIN_LENGTH and self._buf is not None:
+            bulk = _unpack_numbers(self._buf, self._pos, length)
+            if bulk is not None:
+                res, self._pos = bulk
+                return res
         res = [None] * length
         next_tlv = self.next_tlv
         dispatch = self.dispatch
         forbidden = FORBIDDEN
         streams = STREAMS
-        for _ in range(length):
+        numbers = NUMBERS
+        scalars = SCALARS
+        for i in xrange(length):
             tag, length, value = next_tlv()
-            if tag in forbidden:
-                raise MarkerError('invalid marker occurs: %02X' % ord(tag))
-            item = dispatch[tag](self, tag, length, value)
-            if tag in streams and length == 255:
-                item = list(item)
-            res[_] = item
+            if tag in numbers:
+                item = value
+            elif tag in scalars:
+                item = scalars[tag]
+            elif tag in forbidden:
+                raise MarkerError('invalid marker occurs: %02X' % tag)
+            else:
+                item = dispatch[tag](self, tag, length, value)
+                if tag in streams and length == 255:
+                    item = list(item)
+            res[i] = item
         return res
     dispatch[ARRAY_S] = decode_array
     dispatch[ARRAY_L] = decode_array
@@ -253,16 +548,35 @@ class Draft8Decoder(object):
         forbidden = FORBIDDEN
         object_keys = OBJECT_KEYS
         streams = STREAMS
-        for _ in range(length * 2):
+        numbers = NUMBERS
+        scalars = SCALARS
+        key_cache = self._key_cache
+        for _ in xrange(length * 2):
             tag, length, value = next_tlv()
             if tag in forbidden:
-                raise MarkerError('invalid marker found: %02X' % ord(tag))
-            if key is None and tag not in object_keys:
-                raise MarkerError('key should be string, got %r' % (tag))
-            value = dispatch[tag](self, tag, length, value)
+                raise MarkerError('invalid marker found: %02X' % tag)
             if key is None:
-                key = value
+                if tag not in object_keys:
+                    raise MarkerError('key should be string, got %r'
+                                      % CHARS[tag])
+                # Objects of the same shape repeat the same keys over and
+                # over again, so reuse already decoded short ones.
+                if length < KEY_CACHE_MAX_LENGTH:
+                    key = key_cache.get(value)
+                    if key is None:
+                        key = dispatch[tag](self, tag, length, value)
+                        if len(key_cache) < KEY_CACHE_SIZE:
+                            key_cache[value] = key
+                else:
+                    key = dispatch[tag](self, tag, length, value)
+            elif tag in numbers:
+                res[key] = value
+                key = None
+            elif tag in scalars:
+                res[key] = scalars[tag]
+                key = None
             else:
+                value = dispatch[tag](self, tag, length, value)
                 if tag in streams and length == 255:
                     value = list(value)
                 res[key] = value
@@ -276,16 +590,23 @@ class Draft8Decoder(object):
         next_tlv = self.next_tlv
         eos = EOS
         streams = STREAMS
+        numbers = NUMBERS
+        scalars = SCALARS
         def array_stream():
             while 1:
                 tag, length, value = next_tlv()
-                if tag == eos:
+                if tag in numbers:
+                    yield value
+                elif tag in scalars:
+                    yield scalars[tag]
+                elif tag == eos:
                     break
-                item = dispatch[tag](self, tag, length, value)
-                if tag in streams and length == 255:
-                    yield list(item)
                 else:
-                    yield item
+                    item = dispatch[tag](self, tag, length, value)
+                    if tag in streams and length == 255:
+                        yield list(item)
+                    else:
+                        yield item
         return array_stream()
 
     def decode_object_stream(self, tag, length, value):
@@ -302,7 +623,7 @@ class Draft8Decoder(object):
                 tag, length, value = next_tlv()
                 if tag == noop and key is None:
                     yield noop_sentinel, noop_sentinel
-                elif tag == NOOP and key:
+                elif tag == noop and key:
                     continue
                 elif tag == eos:
                     if key:
@@ -310,7 +631,8 @@ class Draft8Decoder(object):
                                                     % key)
                     break
                 elif key is None and tag not in object_keys:
-                    raise MarkerError('key should be string, got %r' % (tag))
+                    raise MarkerError('key should be string, got %r'
+                                      % CHARS[tag])
                 else:
                     value = dispatch[tag](self, tag, length, value)
                     if key is None:
@@ -399,134 +721,386 @@ class Draft8Encoder(object):
 
     def __init__(self, default=None):
         self._default = default or self.default
+        self._type_cache = self.dispatch.copy()
+        self._output = None
+        self._flush_size = sys.maxsize
 
     def default(self, obj):
         raise EncodeError('unable to encode %r' % obj)
 
-    def encode_next(self, obj):
-        tobj = type(obj)
-        if tobj in self.dispatch:
-            res = self.dispatch[tobj](self, obj)
-        else:
-            return self.encode_next(self._default(obj))
-        if isinstance(res, bytes):
-            return res
-        return bytes().join(res)
+    def encode_next(self, obj, output=None):
+        """Encodes Python object. If `output` is specified, encoded data is
+        written into it by chunks of about :const:`BUFFER_SIZE` bytes and
+        None is returned."""
+        out = bytearray()
+        # keep outer call state in case of reentrant call from default hook
+        state = self._output, self._flush_size
+        self._output = output
+        self._flush_size = sys.maxsize if output is None else BUFFER_SIZE
+        try:
+            self.encode_into(obj, out)
+        finally:
+            self._output, self._flush_size = state
+        if output is None:
+            return bytes(out)
+        output.write(bytes(out))
+
+    def encode_into(self, obj, out):
+        """Encodes Python object appending data to `out` bytearray."""
+        handler = self._type_cache.get(type(obj))
+        if handler is None:
+            handler = self._find_handler(type(obj))
+            if handler is None:
+                return self.encode_into(self._default(obj), out)
+        handler(self, obj, out)
+
+    def _find_handler(self, tobj):
+        # subclasses of known types are handled as their nearest base
+        for base in tobj.__mro__:
+            if base in self.dispatch:
+                handler = self._type_cache[tobj] = self.dispatch[base]
+                return handler
 
-    def encode_noop(self, obj):
-        return NOOP
+    def _flush(self, out):
+        self._output.write(bytes(out))
+        del out[:]
+
+    def encode_noop(self, obj, out):
+        out.append(NOOP)
     dispatch[type(NOOP_SENTINEL)] = encode_noop
 
-    def encode_none(self, obj):
-        return NULL
+    def encode_none(self, obj, out):
+        out.append(NULL)
     dispatch[type(None)] = encode_none
 
-    def encode_bool(self, obj):
-        return TRUE if obj else FALSE
+    def encode_bool(self, obj, out):
+        out.append(TRUE if obj else FALSE)
     dispatch[bool] = encode_bool
 
-    def encode_int(self, obj):
-        if (-2 ** 7) <= obj <= (2 ** 7 - 1):
-            return INT8 + CHARS[obj % 256]
-        elif (-2 ** 15) <= obj <= (2 ** 15 - 1):
-            return INT16 + pack('>h', obj)
-        elif (-2 ** 31) <= obj <= (2 ** 31 - 1):
-            return INT32 + pack('>i', obj)
-        elif (-2 ** 63) <= obj <= (2 ** 63 - 1):
-            return INT64 + pack('>q', obj)
+    def encode_int(self, obj, out):
+        # bit length of ~obj for negatives fits two's complement ranges
+        bits = (obj if obj >= 0 else ~obj).bit_length()
+        if bits < 8:
+            out += _INT8_VALUES[obj]
+        elif bits < 64:
+            marker, pack = _INT_PACKERS[bits]
+            out += pack(marker, obj)
         else:
-            return self.encode_decimal(Decimal(obj))
+            self.encode_decimal(Decimal(obj), out)
     dispatch[int] = encode_int
     dispatch[long] = encode_int
 
-    def encode_float(self, obj):
+    def encode_float(self, obj, out):
         if 1.18e-38 <= abs(obj) <= 3.4e38:
-            return FLOAT + pack('>f', obj)
+            out += _pack_float(FLOAT, obj)
         elif 2.23e-308 <= abs(obj) < 1.8e308:
-            return DOUBLE + pack('>d', obj)
+            out += _pack_double(DOUBLE, obj)
         elif isinf(obj) or isnan(obj):
-            return NULL
+            out.append(NULL)
         else:
-            return self.encode_decimal(Decimal(obj))
+            self.encode_decimal(Decimal(obj), out)
     dispatch[float] = encode_float
 
-    def _encode_str(self, obj):
+    def _encode_str(self, obj, out):
         length = len(obj)
         if length < 255:
-            return STRING_S + CHARS[length] + obj
+            out += _STRING_S_HEADERS[length]
         else:
-            return STRING_L + INT32 + pack('>i', length) + obj
+            out += _pack_large_size(STRING_L, length)
+        out += obj
 
-    def encode_bytes(self, obj):
+    def encode_bytes(self, obj, out):
         try:
             obj.decode('utf-8')
         except UnicodeDecodeError:
             raise EncodeError('Invalid UTF-8 byte string: %r' % obj)
         else:
-            return self._encode_str(obj)
+            self._encode_str(obj, out)
     dispatch[bytes] = encode_bytes
 
-    def encode_str(self, obj):
-        return self._encode_str(obj.encode('utf-8'))
+    def encode_str(self, obj, out):
+        self._encode_str(obj.encode('utf-8'), out)
     dispatch[unicode] = encode_str
 
-    def encode_decimal(self, obj):
+    def encode_decimal(self, obj, out):
         obj = unicode(obj).encode('utf-8')
         length = len(obj)
         if length < 255:
-            return HIDEF_S + CHARS[length] + obj
+            out += _HIDEF_S_HEADERS[length]
         else:
-            return HIDEF_L + pack('>i', length) + obj
+            out += _pack_large_size(HIDEF_L, length)
+        out += obj
     dispatch[Decimal] = encode_decimal
 
-    def encode_sequence(self, obj):
+    def _encode_ints_array(self, obj, out):
+        # When all items need the same integer type they are written by the
+        # reverse of the decoder bulk path: pack the values with array and
+        # interleave them with markers. Small items are never widened to
+        # keep output the same as item by item encoding produces.
+        low, high = min(obj), max(obj)
+        bits = max((low if low >= 0 else ~low).bit_length(),
+                   (high if high >= 0 else ~high).bit_length())
+        if bits >= 64:
+            return False
+        tag = _INT_MARKERS[bits]
+        if tag not in BULK_NUMBERS:
+            return False
+        least = min(map(abs, obj))
+        least_bits = least.bit_length()
+        if least and not least & (least - 1) and -least in obj:
+            # -2^n fits in one bit less than 2^n does
+            least_bits -= 1
+        if _INT_MARKERS[least_bits] != tag:
+            return False
+        size, typecode = BULK_NUMBERS[tag]
+        values = array(typecode, obj)
+        if size > 1 and sys.byteorder == 'little':
+            values.byteswap()
+        data = _array_tobytes(values)
+        length = len(obj)
+        step = size + 1
+        chunk = bytearray(length * step)
+        chunk[0::step] = CHARS[tag] * length
+        for i in range(size):
+            chunk[i + 1::step] = data[i::size]
+        out += chunk
+        return True
+
+    def encode_sequence(self, obj, out):
         length = len(obj)
         if length < 255:
-            yield ARRAY_S + CHARS[length]
+            out += _ARRAY_S_HEADERS[length]
         else:
-            yield ARRAY_L + pack('>I', length)
+            out += _pack_large_size(ARRAY_L, length)
+        if (length >= BULK_MIN_LENGTH
+                and set(map(type, obj)) <= _INT_TYPES
+                and self._encode_ints_array(obj, out)):
+            if len(out) >= self._flush_size:
+                self._flush(out)
+            return
+        encode_into = self.encode_into
+        flush_size = self._flush_size
         for item in obj:
-            yield self.encode_next(item)
+            encode_into(item, out)
+            if len(out) >= flush_size:
+                self._flush(out)
     dispatch[tuple] = encode_sequence
     dispatch[list] = encode_sequence
     dispatch[set] = encode_sequence
     dispatch[frozenset] = encode_sequence
 
-    def encode_dict(self, obj):
-        length = len(obj)
-        if length < 255:
-            yield OBJECT_S + CHARS[length]
-        else:
-            yield OBJECT_L + pack('>I', length)
-        for key, value in obj.items():
+    def _encode_items(self, items, out):
+        encode_into = self.encode_into
+        flush_size = self._flush_size
+        for key, value in items:
             if isinstance(key, unicode):
-                yield self.encode_str(key)
+                self.encode_str(key, out)
             elif isinstance(key, bytes):
-                yield self.encode_bytes(key)
+                self.encode_bytes(key, out)
             else:
                 raise EncodeError('invalid object key %r' % key)
-            yield self.encode_next(value)
+            encode_into(value, out)
+            if len(out) >= flush_size:
+                self._flush(out)
+
+    def encode_dict(self, obj, out):
+        length = len(obj)
+        if length < 255:
+            out += _OBJECT_S_HEADERS[length]
+        else:
+            out += _pack_large_size(OBJECT_L, length)
+        self._encode_items(obj.items(), out)
     dispatch[dict] = encode_dict
 
-    def encode_generator(self, obj):
-        yield ARRAY_S + FF
+    def encode_generator(self, obj, out):
+        out += _ARRAY_S_HEADERS[FF]
+        encode_into = self.encode_into
+        flush_size = self._flush_size
         for item in obj:
-            yield self.encode_next(item)
-        yield EOS
+            encode_into(item, out)
+            if len(out) >= flush_size:
+                self._flush(out)
+        out.append(EOS)
     dispatch[xrange] = encode_generator
     dispatch[type((i for i in ()))] = encode_generator
     dispatch[dict_keysiterator] = encode_generator
     dispatch[dict_valuesiterator] = encode_generator
 
-    def encode_dictitems(self, obj):
-        yield OBJECT_S + FF
-        for key, value in obj:
-            if isinstance(key, unicode):
-                yield self.encode_str(key)
-            elif isinstance(key, bytes):
-                yield self.encode_bytes(key)
-            else:
-                raise EncodeError('invalid object key %r' % key)
-            yield self.encode_next(value)
-        yield EOS
+    def encode_dictitems(self, obj, out):
+        out += _OBJECT_S_HEADERS[FF]
+        self._encode_items(obj, out)
+        out.append(EOS)
     dispatch[dict_itemsiterator] = encode_dictitems
+
+
+class _SchemaMismatch(Exception):
+    """Raises by compiled schema decoder if data doesn't follow the schema."""
+
+
+class _SchemaCompiler(object):
+    """Generates source of decoding function for data of known schema. The
+    function takes source buffer and position, checks markers of every value
+    on the way and returns decoded object and position after it."""
+
+    def __init__(self):
+        self.lines = []
+        self.namespace = {
+            '_SchemaMismatch': _SchemaMismatch,
+            '_SIGNED_BYTE': _SIGNED_BYTE,
+            '_unpack_int16_from': _unpack_int16_from,
+            '_unpack_int32_from': _unpack_int32_from,
+            '_unpack_int64_from': _unpack_int64_from,
+            '_unpack_float_from': _unpack_float_from,
+            '_unpack_double_from': _unpack_double_from,
+            '_unpack_uint32_from': _unpack_uint32_from,
+            '_unpack_numbers': _unpack_numbers,
+        }
+        self.counter = 0
+
+    def compile(self, schema):
+        self.emit(0, 'def decode(buf, pos):')
+        name = self.emit_value(1, schema)
+        self.emit(1, 'return %s, pos' % name)
+        exec(compile('\n'.join(self.lines), '<ubjson schema>', 'exec'),
+             self.namespace)
+        return self.namespace['decode']
+
+    def emit(self, level, line):
+        self.lines.append('    ' * level + line)
+
+    def new_name(self, prefix):
+        self.counter += 1
+        return '%s%d' % (prefix, self.counter)
+
+    def constant(self, value):
+        name = self.new_name('_const')
+        self.namespace[name] = value
+        return name
+
+    def emit_value(self, level, schema):
+        if schema is bool:
+            return self.emit_bool(level)
+        elif schema in (int, long):
+            return self.emit_int(level)
+        elif schema is float:
+            return self.emit_float(level)
+        elif schema in (unicode, str):
+            return self.emit_string(level)
+        elif isinstance(schema, list) and len(schema) == 1:
+            return self.emit_array(level, schema[0])
+        elif isinstance(schema, dict):
+            return self.emit_object(level, schema)
+        raise TypeError('unsupported schema %r' % (schema,))
+
+    def emit_numbers(self, level, name, numbers):
+        emit = self.emit
+        emit(level, 'tag = buf[pos]')
+        for idx, (tag, size, unpack) in enumerate(numbers):
+            emit(level, '%s tag == %d:' % (idx and 'elif' or 'if', tag))
+            if unpack is None:
+                emit(level + 1, '%s = _SIGNED_BYTE[buf[pos + 1]]' % name)
+            else:
+                emit(level + 1, '%s, = %s(buf, pos + 1)' % (name, unpack))
+            emit(level + 1, 'pos += %d' % (size + 1))
+        emit(level, 'else:')
+        emit(level + 1, 'raise _SchemaMismatch')
+
+    def emit_bool(self, level):
+        name = self.new_name('value')
+        booleans = self.constant({TRUE: True, FALSE: False})
+        self.emit(level, '%s = %s.get(buf[pos])' % (name, booleans))
+        self.emit(level, 'if %s is None:' % name)
+        self.emit(level + 1, 'raise _SchemaMismatch')
+        self.emit(level, 'pos += 1')
+        return name
+
+    def emit_int(self, level):
+        name = self.new_name('value')
+        self.emit_numbers(level, name, [
+            (INT8, 1, None),
+            (INT16, 2, '_unpack_int16_from'),
+            (INT32, 4, '_unpack_int32_from'),
+            (INT64, 8, '_unpack_int64_from')])
+        return name
+
+    def emit_float(self, level):
+        name = self.new_name('value')
+        self.emit_numbers(level, name, [
+            (FLOAT, 4, '_unpack_float_from'),
+            (DOUBLE, 8, '_unpack_double_from')])
+        return name
+
+    def emit_size(self, level, short_tag, large_tag):
+        emit = self.emit
+        name = self.new_name('length')
+        emit(level, 'tag = buf[pos]')
+        emit(level, 'if tag == %d and buf[pos + 1] != 255:' % short_tag)
+        emit(level + 1, '%s = buf[pos + 1]' % name)
+        emit(level + 1, 'pos += 2')
+        emit(level, 'elif tag == %d:' % large_tag)
+        emit(level + 1, '%s, = _unpack_uint32_from(buf, pos + 1)' % name)
+        emit(level + 1, 'pos += 5')
+        emit(level, 'else:')
+        emit(level + 1, 'raise _SchemaMismatch')
+        return name
+
+    def emit_string(self, level):
+        name = self.new_name('value')
+        length = self.emit_size(level, STRING_S, STRING_L)
+        self.emit(level, "%s = buf[pos:pos + %s].decode('utf-8')"
+                         "" % (name, length))
+        self.emit(level, 'pos += %s' % length)
+        return name
+
+    def emit_array(self, level, item_schema):
+        emit = self.emit
+        name = self.new_name('array')
+        length = self.emit_size(level, ARRAY_S, ARRAY_L)
+        index = self.new_name('i')
+        if item_schema in (int, long, float):
+            bulk = self.new_name('bulk')
+            emit(level, '%s = None' % bulk)
+            emit(level, 'if %s >= %d:' % (length, BULK_MIN_LENGTH))
+            emit(level + 1, '%s = _unpack_numbers(buf, pos, %s)'
+                            '' % (bulk, length))
+            emit(level, 'if %s is not None:' % bulk)
+            emit(level + 1, '%s, pos = %s' % (name, bulk))
+            emit(level, 'else:')
+            level += 1
+        emit(level, '%s = [None] * %s' % (name, length))
+        emit(level, 'for %s in range(%s):' % (index, length))
+        item = self.emit_value(level + 1, item_schema)
+        emit(level + 1, '%s[%s] = %s' % (name, index, item))
+        return name
+
+    def emit_expected(self, level, expected):
+        self.emit(level, 'if buf[pos:pos + %d] != %s:'
+                         '' % (len(expected), self.constant(expected)))
+        self.emit(level + 1, 'raise _SchemaMismatch')
+        self.emit(level, 'pos += %d' % len(expected))
+
+    def emit_object(self, level, schema):
+        emit = self.emit
+        # sized object header and every key have exactly known encoded form
+        # so they are just compared with expected bytes
+        encoder = Draft8Encoder()
+        if len(schema) < 255:
+            expected = _OBJECT_S_HEADERS[len(schema)]
+        else:
+            expected = _pack_large_size(OBJECT_L, len(schema))
+        items = []
+        for key, value_schema in schema.items():
+            if isinstance(key, bytes):
+                key = key.decode('utf-8')
+            elif not isinstance(key, unicode):
+                raise TypeError('unsupported schema key %r' % (key,))
+            expected += encoder.encode_next(key)
+            self.emit_expected(level, expected)
+            items.append((key, self.emit_value(level, value_schema)))
+            expected = bytes()
+        if expected:
+            self.emit_expected(level, expected)
+        name = self.new_name('object')
+        emit(level, '%s = {%s}' % (name, ', '.join(
+            '%s: %s' % (self.constant(key), value) for key, value in items)))
+        return name
@@ -7,11 +7,14 @@
 # you should have received as part of this distribution.
 #
 
+import gc
 import unittest
+import weakref
 import simpleubjson
 from types import GeneratorType
 from decimal import Decimal
-from simpleubjson.compat import BytesIO as StringIO, b, u, long, xrange
+from simpleubjson.compat import BytesIO as StringIO, b, u, bytes, long, xrange
+from simpleubjson.draft8 import Draft8Decoder, Draft8Encoder, KEY_CACHE_SIZE
 
 
 class Draft8TestCase(unittest.TestCase):
@@ -36,6 +39,23 @@ class DecoderTestCase(Draft8TestCase):
     def test_fail_on_unknown_marker(self):
         self.assertRaises(ValueError, self.decode, 'Я')
 
+    def test_decode_from_stream(self):
+        data = self.decode(StringIO(b('a\x03B\x01s\x03fooI\x00\x01\x88\x94')))
+        self.assertEqual(data, [1, 'foo', 100500])
+
+    def test_decoder_is_freed_without_gc(self):
+        data = b('a\x02B\x01B\x02')
+        for source in (data, StringIO(data)):
+            gc.disable()
+            try:
+                decoder = Draft8Decoder(source)
+                decoder.decode_next()
+                ref = weakref.ref(decoder)
+                del decoder
+                self.assertTrue(ref() is None)
+            finally:
+                gc.enable()
+
     def test_custom_default_handler(self):
         def dummy(stream, markers, tag):
             assert tag == '%'
@@ -56,6 +76,24 @@ class EncoderTestCase(Draft8TestCase):
         self.assertEqual(stream.getvalue(),
                          b('a\xffB\x00B\x01B\x02B\x03B\x04E'))
 
+    def test_write_large_data_to_stream_by_chunks(self):
+        chunks = []
+        class Stream(object):
+            def write(self, data):
+                chunks.append(data)
+        data = [{'foo': 'bar' * 100, 'baz': list(range(100))}] * 1000
+        self.encode(data, Stream())
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(bytes().join(chunks), self.encode(data))
+
+    def test_encode_subclasses_of_known_types(self):
+        class Int(int):
+            pass
+        class Dict(dict):
+            pass
+        data = self.encode(Dict(foo=[Int(42), Int(100500)]))
+        self.assertEqual(data, b('o\x01s\x03fooa\x02B\x2aI\x00\x01\x88\x94'))
+
     def test_custom_default_handler(self):
         sentinel = object()
         def dummy(value):
@@ -64,6 +102,26 @@ class EncoderTestCase(Draft8TestCase):
         data = self.encode(sentinel, default=dummy)
         self.assertEqual(data, b('a\x01s\x08sentinel'))
 
+    def test_encode_into_bytearray(self):
+        out = bytearray(b('Z'))
+        Draft8Encoder().encode_into(['foo', 42], out)
+        self.assertEqual(bytes(out), b('Za\x02s\x03fooB\x2a'))
+
+    def test_reentrant_default_handler(self):
+        chunks = []
+        class Stream(object):
+            def write(self, data):
+                chunks.append(data)
+        sentinel = object()
+        def dummy(value):
+            return encoder.encode_next(42)
+        encoder = Draft8Encoder(dummy)
+        data = [sentinel] + ['foo' * 100] * 1000
+        encoder.encode_next(data, Stream())
+        self.assertTrue(len(chunks) > 1)
+        data[0] = b('B\x2a')
+        self.assertEqual(bytes().join(chunks), self.encode(data))
+
 
 class NoopTestCase(Draft8TestCase):
 
@@ -124,6 +182,12 @@ class ByteTestCase(Draft8TestCase):
         data = self.encode(-42)
         self.assertEqual(data, b('B\xd6'))
 
+    def test_decode_min_value(self):
+        data = self.decode(b('B\x80'))
+        self.assertEqual(data, -128)
+        data = self.decode(StringIO(b('B\x80')))
+        self.assertEqual(data, -128)
+
 
 class Integer16TestCase(Draft8TestCase):
 
@@ -202,6 +266,11 @@ class HugeNumberTestCase(Draft8TestCase):
         data = self.decode(source)
         self.assertEqual(data, expected)
 
+    def test_decode_huge_digits_number(self):
+        source = b('H\x00\x00\x50\x00') + b('1') * 20480
+        data = self.decode(source)
+        self.assertEqual(data, Decimal('1' * 20480))
+
     def test_encode(self):
         source = 314159265358979323846264338327950288419716939937510
         expected = b('h\x33314159265358979323846264338327950288419716939937510')
@@ -300,6 +369,21 @@ class StringTestCase(Draft8TestCase):
         data = self.encode(u('привет'))
         self.assertEqual(data, expected)
 
+    def test_decode_large_string(self):
+        data = self.decode(b('S\x00\x00\x01\x00') + b('x') * 256)
+        self.assertEqual(data, 'x' * 256)
+
+    def test_decode_huge_string(self):
+        data = self.decode(b('S\x00\x01\x00\x00') + b('x') * 65536)
+        self.assertEqual(data, 'x' * 65536)
+        data = self.decode(b('o\x01S\x00\x01\x00\x00') + b('x') * 65536
+                           + b('Z'))
+        self.assertEqual(data, {'x' * 65536: None})
+
+    def test_encode_large_string(self):
+        data = self.encode('x' * 256)
+        self.assertEqual(data, b('S\x00\x00\x01\x00') + b('x') * 256)
+
 
 class ArrayTestCase(Draft8TestCase):
 
@@ -327,6 +411,50 @@ class ArrayTestCase(Draft8TestCase):
         data = self.encode(list([1] * 1024))
         self.assertEqual(data, b('A\x00\x00\x04\x00') + b('B\x01') * 1024)
 
+    def test_decode_large_numbers_array(self):
+        for items in ([-42, 1, 127] * 20,
+                      [-12345, 256, 32767] * 20,
+                      [-100500, 65536, 2147483647] * 20,
+                      [long('-9223372036854775808'), 2 ** 40] * 20,
+                      [0.5, -2.25, 1024.125] * 20,
+                      [100500e234, -1.5e-300] * 20):
+            data = self.decode(self.encode(items))
+            self.assertEqual(data, items)
+
+    def test_fail_decode_truncated_large_numbers_array(self):
+        for source in (b('a\x40'), b('A\x00\x00\x00\x40'),
+                       b('a\x40') + b('B\x01') * 10):
+            self.assertRaises(ValueError, self.decode, source)
+
+    def test_decode_large_mixed_numbers_array(self):
+        items = [1, 1000, 100500, 3.5] * 20
+        data = self.decode(self.encode(items))
+        self.assertEqual(data, items)
+
+    def test_decode_large_numbers_array_with_noops(self):
+        data = self.decode(b('a\x40') + b('NB\x01') * 64)
+        self.assertEqual(data, [1] * 64)
+
+    def test_encode_large_integers_array(self):
+        data = self.encode([1000, -1000] * 20)
+        self.assertEqual(data, b('a\x28') + b('i\x03\xe8i\xfc\x18') * 20)
+        data = self.encode([1, 1000] * 20)
+        self.assertEqual(data, b('a\x28') + b('B\x01i\x03\xe8') * 20)
+        data = self.encode([-128, 127] * 20)
+        self.assertEqual(data, b('a\x28') + b('B\x80B\x7f') * 20)
+        data = self.encode([-128, 128] * 20)
+        self.assertEqual(data, b('a\x28') + b('B\x80i\x00\x80') * 20)
+        data = self.encode([0] * 1000 + [2 ** 40])
+        self.assertEqual(len(data), 2014)
+        data = self.encode([-1, -100500, long('9223372036854775807')] * 20)
+        self.assertEqual(self.decode(data),
+                         [-1, -100500, long('9223372036854775807')] * 20)
+
+    def test_encode_large_array_of_huge_integers(self):
+        items = [1, 2 ** 64] * 20
+        data = self.encode(items)
+        self.assertEqual(self.decode(data), items)
+
     def test_encode_set(self):
         data = self.encode(set(['foo', 'foo', 'foo']))
         self.assertEqual(data, b('a\x01s\x03foo'))
@@ -465,6 +593,69 @@ class ObjectTestCase(Draft8TestCase):
     def test_fail_decode_on_early_end(self):
         self.assertRaises(ValueError, self.decode, b('o\x01'))
 
+    def test_decode_same_keys_once(self):
+        items = [{'name': 'foo', 'value': i} for i in range(10)]
+        decoder = Draft8Decoder(self.encode(items))
+        data = decoder.decode_next()
+        self.assertEqual(data, items)
+        names = set(id(key) for item in data for key in item
+                    if key == 'name')
+        self.assertEqual(len(names), 1)
+
+    def test_key_cache_size_is_limited(self):
+        items = [{'key%d' % i: i} for i in range(KEY_CACHE_SIZE * 2)]
+        decoder = Draft8Decoder(self.encode(items))
+        self.assertEqual(decoder.decode_next(), items)
+        self.assertEqual(len(decoder._key_cache), KEY_CACHE_SIZE)
+
+
+class CompiledSchemaTestCase(Draft8TestCase):
+
+    def setUp(self):
+        super(CompiledSchemaTestCase, self).setUp()
+        schema = {'id': int, 'name': u('name').__class__, 'ok': bool,
+                  'scores': [float], 'nested': {'items': [int]}}
+        self.decode_schema = Draft8Decoder.compile_schema(schema)
+
+    def test_decode(self):
+        data = {'id': 100500, 'name': u('привет'), 'ok': True,
+                'scores': [0.5, 1e300], 'nested': {'items': [1, 2, 3]}}
+        self.assertEqual(self.decode_schema(self.encode(data)), data)
+
+    def test_decode_large_arrays(self):
+        data = {'id': 42, 'name': 'x' * 300, 'ok': False,
+                'scores': [0.5] * 300, 'nested': {'items': list(range(300))}}
+        self.assertEqual(self.decode_schema(self.encode(data)), data)
+
+    def test_fallback_on_schema_mismatch(self):
+        for data in ({'id': 1.5, 'name': 'foo', 'ok': True,
+                      'scores': [], 'nested': {'items': []}},
+                     {'id': 1, 'name': 'foo', 'ok': None,
+                      'scores': [], 'nested': {'items': []}},
+                     {'id': 1, 'name': 'foo', 'ok': True,
+                      'scores': [], 'nested': {'items': ['bar']}},
+                     {'id': 1, 'name': 'foo', 'ok': True, 'scores': []},
+                     [1, 2, 3]):
+            self.assertEqual(self.decode_schema(self.encode(data)), data)
+
+    def test_fallback_on_noops(self):
+        source = b('NNNo\x01s\x02idNB\x2a')
+        self.assertEqual(self.decode_schema(source), {'id': 42})
+
+    def test_fail_on_early_end(self):
+        source = b('o\x05s\x02id')
+        self.assertRaises(ValueError, self.decode_schema, source)
+
+    def test_decode_from_stream(self):
+        data = {'id': 1, 'name': 'foo', 'ok': True,
+                'scores': [], 'nested': {'items': []}}
+        source = StringIO(self.encode(data))
+        self.assertEqual(self.decode_schema(source), data)
+
+    def test_fail_on_unsupported_schema(self):
+        self.assertRaises(TypeError, Draft8Decoder.compile_schema, {'x': list})
+        self.assertRaises(TypeError, Draft8Decoder.compile_schema, {1: int})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -46,7 +46,7 @@ def pprint(data, output=sys.stdout, allow_noop=True,
         while 1:
             try:
                 tag, length, value = decoder.next_tlv()
-                utag = tag.decode()
+                utag = chr(tag)
             except EarlyEndOfStreamError:
                 break
             # standalone markers